@@ -7,6 +7,7 @@ import uvicorn
 
 from finrobot_api.finrobot_market_api import MarketAnalystService, AnalysisResponse
 from my_api.sector_normalization import main as sector_normalization_main
+from my_api.price_history import fetch_price_metrics
 
 app = FastAPI(
     title="FinFun API",
@@ -32,7 +33,8 @@ async def root():
         "message": "Welcome to FinFun API",
         "endpoints": {
             "market_analysis": "/api/analyze/{symbol}",
-            "sector_normalization": "/api/sectors/normalization"
+            "sector_normalization": "/api/sectors/normalization",
+            "price_metrics": "/api/prices/metrics"
         }
     }
 
@@ -84,5 +86,25 @@ async def get_sector_normalization():
         print("Error in sector normalization:", str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/prices/metrics")
+async def get_price_metrics(
+    symbols: str = Query(..., description="Comma-separated list of ticker symbols"),
+    refresh: bool = Query(
+        default=True,
+        description="Download new trading days before computing metrics"
+    )
+) -> List[Dict[str, Any]]:
+    """
+    Get price-based metrics (52-week high, discount, momentum) from the price history store.
+    Cheap to call intraday: only trading days missing from the store are downloaded.
+    """
+    try:
+        symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
+        metrics = await fetch_price_metrics(symbol_list, refresh=refresh)
+        metrics = metrics.astype(object).where(metrics.notna(), None)
+        return metrics.reset_index().to_dict(orient='records')
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -0,0 +1,371 @@
+import asyncio
+import json
+import threading
+import warnings
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+# Column order of the last axis of the OHLC array
+OPEN, HIGH, LOW, CLOSE = range(4)
+FIELDS = ['Open', 'High', 'Low', 'Close']
+
+# Trading days in 52 weeks, and the lookback windows for momentum features
+TRADING_DAYS_52W = 252
+MOMENTUM_WINDOWS = {'momentum_1m': 21, 'momentum_3m': 63, 'momentum_6m': 126}
+
+DEFAULT_STORE_DIR = Path(__file__).parent.parent / "data" / "price_history"
+DEFAULT_BATCH_SIZE = 100
+# Extra calendar days fetched on first load so the 52-week window is full
+INITIAL_LOOKBACK_DAYS = 400
+# Relative difference between a stored and re-downloaded close that marks a split
+# or other corporate action
+ADJUSTMENT_TOLERANCE = 0.005
+# Days to wait before retrying a symbol that returned no price history
+FAILED_RETRY_DAYS = 7
+# Days added to the array file each time it runs out of room
+GROWTH_DAYS = 64
+
+
+def _initial_start() -> str:
+    return (date.today() - timedelta(days=INITIAL_LOOKBACK_DAYS)).isoformat()
+
+
+class PriceHistoryStore:
+    """
+    Daily OHLC history for a universe of tickers, kept in a memory-mapped
+    float32 array of shape (days, symbols, 4) under `directory`.
+
+    Rows are trading days, so appending a day only extends the file.
+    Adding symbols rewrites the file with the wider layout.
+    """
+
+    def __init__(self, directory: Path = DEFAULT_STORE_DIR, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.data_path = self.directory / "ohlc.dat"
+        self.meta_path = self.directory / "meta.json"
+        self.symbols: List[str] = []
+        self.dates: List[str] = []
+        self.capacity = 0
+        # Symbol -> ISO date of the last download that returned no data
+        self.failed: Dict[str, str] = {}
+        self._index: Dict[str, int] = {}
+        self._array: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not self.meta_path.exists() or not self.data_path.exists():
+            return
+        with open(self.meta_path, 'r') as file:
+            meta = json.load(file)
+        self.symbols = meta['symbols']
+        self.dates = meta['dates']
+        self.capacity = meta['capacity']
+        self.failed = meta.get('failed', {})
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+        # A crash between rewriting ohlc.dat and meta.json leaves them out of step;
+        # start over rather than read misaligned rows
+        expected_size = self.capacity * len(self.symbols) * 4 * np.dtype(np.float32).itemsize
+        if self.data_path.stat().st_size != expected_size:
+            print(f"Price history store at {self.directory} does not match its metadata, rebuilding...")
+            self._reset()
+            return
+        if self.symbols and self.capacity:
+            self._array = np.memmap(self.data_path, dtype=np.float32, mode='r+',
+                                    shape=(self.capacity, len(self.symbols), 4))
+
+    def _reset(self):
+        self.symbols, self.dates, self.capacity, self.failed, self._index = [], [], 0, {}, {}
+        self._array = None
+        self.data_path.unlink(missing_ok=True)
+        self.meta_path.unlink(missing_ok=True)
+
+    def _save_meta(self):
+        if self._array is not None:
+            self._array.flush()
+        tmp_path = self.meta_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as file:
+            json.dump({'symbols': self.symbols, 'dates': self.dates, 'capacity': self.capacity,
+                       'failed': self.failed}, file)
+        tmp_path.replace(self.meta_path)
+
+    def _open(self, capacity: int, n_symbols: int) -> np.memmap:
+        mode = 'r+' if self.data_path.exists() else 'w+'
+        return np.memmap(self.data_path, dtype=np.float32, mode=mode, shape=(capacity, n_symbols, 4))
+
+    def _add_symbols(self, new_symbols: List[str]):
+        """Widen the array to hold `new_symbols`, copying existing data across."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        old_array, old_count = self._array, len(self.symbols)
+        self.symbols = self.symbols + new_symbols
+        self._index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.capacity = max(self.capacity, GROWTH_DAYS)
+
+        tmp_path = self.data_path.with_suffix('.tmp')
+        new_array = np.memmap(tmp_path, dtype=np.float32, mode='w+',
+                              shape=(self.capacity, len(self.symbols), 4))
+        new_array[:] = np.nan
+        if old_array is not None:
+            new_array[:, :old_count] = old_array
+        new_array.flush()
+        del new_array, old_array
+        self._array = None
+        tmp_path.replace(self.data_path)
+        self._array = self._open(self.capacity, len(self.symbols))
+        self._save_meta()
+
+    def _grow(self, n_days: int):
+        """Make room for at least `n_days` rows; existing rows stay in place."""
+        if n_days <= self.capacity:
+            return
+        new_capacity = n_days + GROWTH_DAYS
+        self._array.flush()
+        self._array = None
+        row_bytes = len(self.symbols) * 4 * np.dtype(np.float32).itemsize
+        with open(self.data_path, 'r+b') as file:
+            file.truncate(new_capacity * row_bytes)
+        self._array = self._open(new_capacity, len(self.symbols))
+        self._array[self.capacity:] = np.nan
+        self.capacity = new_capacity
+        self._save_meta()
+
+    def _write(self, frames: Dict[str, pd.DataFrame]):
+        """
+        Write per-symbol OHLC frames into the store.
+        Dates already stored are overwritten (this refreshes a partial intraday bar),
+        later dates are appended. Dates before the last stored day that the store
+        does not know about are dropped.
+        """
+        if not frames:
+            return
+        all_dates = sorted(set().union(*(frame.index for frame in frames.values())))
+        last = self.dates[-1] if self.dates else None
+        new_dates = [d for d in all_dates if last is None or d > last]
+        self._grow(len(self.dates) + len(new_dates))
+        self.dates.extend(new_dates)
+        row_of = {d: i for i, d in enumerate(self.dates)}
+
+        for symbol, frame in frames.items():
+            frame = frame[frame.index.isin(list(row_of))]
+            if frame.empty:
+                continue
+            rows = np.array([row_of[d] for d in frame.index])
+            self._array[rows, self._index[symbol]] = frame[FIELDS].to_numpy(dtype=np.float32)
+
+    def _download(self, symbols: List[str], start: str) -> Tuple[Dict[str, pd.DataFrame], List[str]]:
+        """
+        Download daily OHLC for `symbols` from `start`, `batch_size` tickers per request.
+        Returns the frames by symbol and the symbols missing from batches that otherwise
+        returned data. A batch that raised or came back empty (as yfinance does when rate
+        limited) says nothing about its symbols, so they are in neither.
+        """
+        frames = {}
+        missing = []
+        for i in range(0, len(symbols), self.batch_size):
+            batch = symbols[i:i + self.batch_size]
+            try:
+                data = yf.download(batch, start=start, interval='1d', group_by='ticker',
+                                   auto_adjust=False, threads=True, progress=False)
+            except Exception as e:
+                print(f"Failed to download price history for batch starting {batch[0]}: {str(e)}")
+                continue
+            if data is None or data.empty:
+                continue
+            data.index = pd.to_datetime(data.index).strftime('%Y-%m-%d')
+            for symbol in batch:
+                if isinstance(data.columns, pd.MultiIndex):
+                    if symbol not in data.columns.get_level_values(0):
+                        missing.append(symbol)
+                        continue
+                    frame = data[symbol]
+                else:
+                    frame = data
+                frame = frame[FIELDS].dropna(how='all')
+                if frame.empty:
+                    missing.append(symbol)
+                else:
+                    frames[symbol] = frame
+        return frames, missing
+
+    def _backfill_start(self) -> str:
+        """
+        Start date for loading a symbol's full history: the first stored date, but no
+        earlier than the initial lookback, since metrics only read the last year.
+        """
+        return max(self.dates[0], _initial_start()) if self.dates else _initial_start()
+
+    def _refresh_starts(self, symbols: List[str]) -> List[Tuple[str, bool]]:
+        """
+        Date each symbol's refresh should start from, and whether its first bar can be
+        checked against the store for a split. With two or more stored closes the refresh
+        starts from the second-to-last one, a completed bar. With a single close (possibly
+        a partial intraday bar) it starts from that bar without the check, and without
+        any it starts from the backfill start.
+        """
+        if not symbols:
+            return []
+        if not self.dates:
+            return [(_initial_start(), False)] * len(symbols)
+        cols = np.array([self._index[s] for s in symbols])
+        valid = ~np.isnan(self._array[:len(self.dates)][:, cols, CLOSE])
+        starts = []
+        for j in range(len(symbols)):
+            rows = np.flatnonzero(valid[:, j])
+            if len(rows) > 1:
+                starts.append((self.dates[rows[-2]], True))
+            elif len(rows):
+                starts.append((self.dates[rows[0]], False))
+            else:
+                starts.append((self._backfill_start(), False))
+        return starts
+
+    def _adjusted_symbols(self, frames: Dict[str, pd.DataFrame], start: str) -> List[str]:
+        """
+        Symbols whose re-downloaded close on `start` no longer matches the stored one.
+        yfinance rescales history after splits and similar corporate actions, so a
+        mismatch means the symbol's stored bars are on an old price scale.
+        """
+        row = self.dates.index(start)
+        adjusted = []
+        for symbol, frame in frames.items():
+            if start not in frame.index or pd.isna(frame.at[start, 'Close']):
+                continue
+            stored = self._array[row, self._index[symbol], CLOSE]
+            if not np.isnan(stored) and not np.isclose(stored, frame.at[start, 'Close'], rtol=ADJUSTMENT_TOLERANCE):
+                adjusted.append(symbol)
+        return adjusted
+
+    def _record_results(self, frames: Dict[str, pd.DataFrame], missing: List[str]):
+        """Mark `missing` symbols as failed and clear the ones that returned data."""
+        today = date.today().isoformat()
+        for symbol in missing:
+            self.failed[symbol] = today
+        for symbol in frames:
+            self.failed.pop(symbol, None)
+
+    def _retry_due(self, symbol: str) -> bool:
+        failed_on = self.failed.get(symbol)
+        return failed_on is None or \
+            date.fromisoformat(failed_on) + timedelta(days=FAILED_RETRY_DAYS) <= date.today()
+
+    def update(self, symbols: List[str]):
+        """
+        Bring the store up to date for `symbols`.
+        Symbols seen for the first time are backfilled from the start of the store,
+        at most INITIAL_LOOKBACK_DAYS back; known symbols only fetch
+        from their last stored trading days onwards. A known symbol whose earlier
+        bars were rescaled by yfinance is cleared and backfilled again. Symbols that
+        returned no data (delisted or unknown to yfinance) are not added to the store
+        and are skipped for FAILED_RETRY_DAYS before being tried again.
+        """
+        with self._lock:
+            symbols = [s for s in dict.fromkeys(symbols) if self._retry_due(s)]
+            new_symbols = [s for s in symbols if s not in self._index]
+            known_symbols = [s for s in symbols if s in self._index]
+
+            if new_symbols:
+                start = self._backfill_start()
+                print(f"Loading price history for {len(new_symbols)} new symbols from {start}...")
+                frames, missing = self._download(new_symbols, start)
+                self._record_results(frames, missing)
+                # Only symbols that returned data get a column; the rest stay out of
+                # the array so unknown tickers cannot widen the file
+                loaded = [s for s in new_symbols if s in frames]
+                if loaded:
+                    self._add_symbols(loaded)
+                    self._write(frames)
+
+            # Group known symbols by refresh start so each batch only asks
+            # for the days it is missing
+            by_start: Dict[Tuple[str, bool], List[str]] = {}
+            for symbol, key in zip(known_symbols, self._refresh_starts(known_symbols)):
+                by_start.setdefault(key, []).append(symbol)
+            adjusted = []
+            for (start, check), group in sorted(by_start.items()):
+                print(f"Refreshing price history for {len(group)} symbols from {start}...")
+                frames, missing = self._download(group, start)
+                self._record_results(frames, missing)
+                if check:
+                    for symbol in self._adjusted_symbols(frames, start):
+                        adjusted.append(symbol)
+                        del frames[symbol]
+                self._write(frames)
+
+            if adjusted:
+                print(f"Reloading price history for {len(adjusted)} symbols with adjusted prices...")
+                self._array[:, [self._index[s] for s in adjusted]] = np.nan
+                frames, missing = self._download(adjusted, self._backfill_start())
+                self._record_results(frames, missing)
+                self._write(frames)
+
+            if self._array is not None:
+                self._save_meta()
+
+    def metrics(self, symbols: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Compute price-based metrics for `symbols` (default: every stored symbol),
+        vectorized over the whole universe. Returns a DataFrame indexed by symbol with
+        price, fifty_two_week_high, discount_from_52w and momentum columns.
+        """
+        columns = ['price', 'fifty_two_week_high', 'discount_from_52w', *MOMENTUM_WINDOWS]
+        with self._lock:
+            if symbols is None:
+                symbols = self.symbols
+            known = [s for s in symbols if s in self._index]
+            if self._array is None or not self.dates or not known:
+                return pd.DataFrame(index=pd.Index(symbols, name='symbol'), columns=columns, dtype=float)
+
+            n_days = len(self.dates)
+            window = max(TRADING_DAYS_52W, *MOMENTUM_WINDOWS.values()) + 1
+            cols = np.array([self._index[s] for s in known])
+            block = np.asarray(self._array[max(0, n_days - window):n_days][:, cols], dtype=np.float64)
+
+        # Forward-fill closes so halted or not-yet-updated symbols use their last trade
+        closes = pd.DataFrame(block[:, :, CLOSE]).ffill().to_numpy()
+        price = closes[-1]
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            high = np.nanmax(block[-TRADING_DAYS_52W:, :, HIGH], axis=0)
+        high = np.where(high > 0, high, np.nan)
+
+        result = pd.DataFrame({
+            'price': price,
+            'fifty_two_week_high': high,
+            'discount_from_52w': (high - price) / high,
+        }, index=pd.Index(known, name='symbol'))
+        for name, days in MOMENTUM_WINDOWS.items():
+            past = closes[-1 - days] if len(closes) > days else np.full(len(known), np.nan)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result[name] = np.where(past > 0, price / past - 1, np.nan)
+
+        return result.reindex(pd.Index(symbols, name='symbol'))[columns]
+
+
+_store: Optional[PriceHistoryStore] = None
+
+
+def get_price_store() -> PriceHistoryStore:
+    """Return the shared price history store, opening it on first use."""
+    global _store
+    if _store is None:
+        _store = PriceHistoryStore()
+    return _store
+
+
+async def fetch_price_metrics(symbols: List[str], refresh: bool = True) -> pd.DataFrame:
+    """
+    Update the price history store for `symbols` (unless `refresh` is False)
+    and return their price-based metrics. Downloads and memmap I/O run in a
+    worker thread so they do not block the event loop.
+    """
+    store = get_price_store()
+    if refresh:
+        await asyncio.to_thread(store.update, symbols)
+    return await asyncio.to_thread(store.metrics, symbols)
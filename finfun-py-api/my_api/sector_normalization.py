@@ -3,7 +3,9 @@ import re
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 from pathlib import Path
+import pandas as pd
 from finrobot.data_source.yfinance_utils import YFinanceUtils
+from my_api.price_history import fetch_price_metrics
 
 @dataclass
 class StockData:
@@ -135,9 +137,11 @@ async def fetch_sp1500_tickers_and_sectors() -> List[Dict[str, str]]:
     
     return all_stocks
 
-async def fetch_stock_data(symbols: List[str]) -> List[StockData]:
+async def fetch_stock_data(symbols: List[str], price_metrics: Optional[pd.DataFrame] = None) -> List[StockData]:
     """
     Fetch stock data using FinRobot's YFinanceUtils.
+    Price and discount from 52-week high come from `price_metrics` (see my_api.price_history)
+    when available, falling back to the stock info fields.
     Returns a list of StockData objects containing financial metrics.
     """
     stocks = []
@@ -163,11 +167,15 @@ async def fetch_stock_data(symbols: List[str]) -> List[StockData]:
                 print(f"Skipping {symbol} - missing critical data: {', '.join(missing_data)}")
                 continue
             
-            # Calculate discount from 52-week high
+            # Calculate discount from 52-week high, preferring the price history store
             fifty_two_week_high = stock_info.get('fiftyTwoWeekHigh')
             current_price = stock_info.get('currentPrice')
             discount_from_52w = None
-            if fifty_two_week_high and current_price:
+            if price_metrics is not None and symbol in price_metrics.index \
+                    and pd.notna(price_metrics.at[symbol, 'discount_from_52w']):
+                current_price = float(price_metrics.at[symbol, 'price'])
+                discount_from_52w = float(price_metrics.at[symbol, 'discount_from_52w'])
+            elif fifty_two_week_high and current_price:
                 discount_from_52w = (fifty_two_week_high - current_price) / fifty_two_week_high
             
             stocks.append(StockData(
@@ -249,12 +257,21 @@ async def main(use_nasdaq: bool = False, use_sp1500: bool = False):
         tickers = [item['symbol'] for item in sp500_data]
         print(f"Fetched {len(tickers)} S&P 500 tickers.")
     
-    # 2. Fetch stock data
+    # 2. Refresh price history for the whole universe in batches
+    # (skipping symbols with special characters, as fetch_stock_data does)
+    print('Fetching price history...')
+    try:
+        price_metrics = await fetch_price_metrics([t for t in tickers if '.' not in t])
+    except Exception as e:
+        print(f"Failed to fetch price history, using stock info prices: {str(e)}")
+        price_metrics = None
+    
+    # 3. Fetch stock data
     print('Fetching stock data...')
-    all_stocks = await fetch_stock_data(tickers)
+    all_stocks = await fetch_stock_data(tickers, price_metrics)
     print(f"Fetched data for {len(all_stocks)} stocks.")
     
-    # 3. Group by sector
+    # 4. Group by sector
     sector_map = {}
     for stock in all_stocks:
         if stock.sector not in sector_map:
@@ -266,7 +283,7 @@ async def main(use_nasdaq: bool = False, use_sp1500: bool = False):
     for sector, stocks in sector_map.items():
         print(f"{sector}: {len(stocks)} stocks")
     
-    # 4. Calculate metrics for all sectors
+    # 5. Calculate metrics for all sectors
     sector_data = []
     for sector, stocks in sector_map.items():
         metrics = {